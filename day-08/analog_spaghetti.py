@@ -1,6 +1,7 @@
 import typing as T
 import attr
 import collections
+import numpy as np
 from pprint import pprint
 
 
@@ -124,6 +125,62 @@ def count_1478(display: Display) -> int:
     return sum(1 if len(x) in unique_lengths else 0 for x in display.outputs) 
 
 
+# how many of the ten digits use each segment 'a' through 'g'
+SEGMENT_FREQUENCY = np.array([8, 6, 8, 7, 4, 9, 7], dtype='uint8')
+
+# the true segments lit for each digit 0 through 9
+DIGIT_SEGMENTS = ['abcefg', 'cf', 'acdeg', 'acdfg', 'bcdf', 'abdfg', 'abdefg', 'acf', 'abcdefg', 'abcdfg']
+
+# summing the frequencies of a digit's segments gives a unique signature per digit,
+#   and segment frequencies do not depend on how the wires are crossed
+SIGNATURE_TO_DIGIT = np.full(SEGMENT_FREQUENCY.sum() + 1, -1, dtype='int8')
+for _digit, _segments in enumerate(DIGIT_SEGMENTS):
+    SIGNATURE_TO_DIGIT[sum(SEGMENT_FREQUENCY[ABC.index(x)] for x in _segments)] = _digit
+
+
+def parse_batch(filename: str) -> np.ndarray:
+    """Return (N, 14) array of signal bitmasks, 10 digits then 4 outputs per display
+
+    Bit k is set if segment ABC[k] is lit
+    """
+    with open(filename, 'rb') as fp:
+        buf = np.frombuffer(fp.read(), dtype='uint8')
+
+    # each run of letters is one signal, everything else is a separator
+    is_letter = (buf >= ord('a')) & (buf <= ord('g'))
+    letters = buf[is_letter]
+    is_first = np.diff(is_letter.astype('int8'), prepend=0)[is_letter] == 1
+
+    # segments within a signal are distinct, so summing bits is the same as or-ing them
+    bits = np.left_shift(1, letters - ord('a')).astype('uint8')
+    masks = np.add.reduceat(bits, np.flatnonzero(is_first), dtype='uint8') if bits.size else bits
+
+    if masks.size % 14 != 0:
+        raise ValueError('Expected 10 digits and 4 outputs per display')
+    return masks.reshape(-1, 14)
+
+
+def batch_count_1478(masks: np.ndarray) -> int:
+    """Count the easily-identified output digits 1, 4, 7, or 8 over all displays"""
+    lengths = np.unpackbits(masks[:, 10:, np.newaxis], axis=-1).sum(axis=-1)
+    return int(np.isin(lengths, [2, 3, 4, 7]).sum())
+
+
+def batch_translate(masks: np.ndarray) -> np.ndarray:
+    """Translate the outputs of all displays, return array of secret values"""
+    bits = np.unpackbits(masks[:, :, np.newaxis], axis=-1, bitorder='little')[:, :, :7]
+
+    # segment frequencies over the 10 digits, per display
+    frequency = bits[:, :10, :].sum(axis=1, dtype='uint8')
+
+    # signature of each output is the sum of its segment frequencies
+    signatures = (bits[:, 10:, :] * frequency[:, np.newaxis, :]).sum(axis=-1)
+    digits = SIGNATURE_TO_DIGIT[signatures]
+    if np.any(digits < 0):
+        raise ValueError('Output signal does not match any digit')
+
+    return digits.astype('int64') @ np.array([1000, 100, 10, 1])
+
 
 if __name__ == '__main__':
 
@@ -138,6 +195,11 @@ if __name__ == '__main__':
     print('puzzle 2 ----------')
     total = sum(d.translate() for d in displays)
     print(f'The sum of the displays is: {total}')
+
+    print('batched ----------')
+    masks = parse_batch(input_file)
+    print(f'The number of easily-identified output digits is: {batch_count_1478(masks)}')
+    print(f'The sum of the displays is: {batch_translate(masks).sum()}')
     
 
     
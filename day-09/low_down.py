@@ -1,6 +1,9 @@
 import numpy as np
+import os
 import typing as T
-from collections import Counter
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from heapq import nlargest
 from math import prod
 
 
@@ -14,68 +17,252 @@ def parse_input(filename: str) -> np.ndarray:
     return np.pad(data_array, 1, 'constant', constant_values=9)
 
 
-def local_minima(heights: np.ndarray) -> T.List[T.Tuple[int, int]]:
-    kernel = np.array([[0, 1, 0], [1, 0, 1], [0, 1, 0]], dtype='bool')
-    minima = []
-    
-    # loop over interior points only
-    for ii in range(1, heights.shape[0]-1): 
-        for jj in range(1, heights.shape[1]-1):
-            center = heights[ii, jj]    
-            neighborhood = heights[ii-1:ii+2, jj-1:jj+2]
-            if np.all(center < neighborhood[kernel]):
-                minima.append((ii, jj))
+def local_minima(heights: np.ndarray) -> T.Tuple[np.ndarray, np.ndarray]:
+    """Return row and column indices of local minima, excluding the pad"""
+    center = heights[1:-1, 1:-1]
+
+    # compare each interior point to its 4 neighbors all at once
+    is_minimum = (
+        (center < heights[:-2, 1:-1]) &
+        (center < heights[2:, 1:-1]) &
+        (center < heights[1:-1, :-2]) &
+        (center < heights[1:-1, 2:])
+    )
+    rows, cols = np.nonzero(is_minimum)
 
-    return minima
+    # shift back to padded coordinates
+    return rows + 1, cols + 1
 
 
 def total_risk(heights: np.ndarray) -> int:
-    locations = local_minima(heights)
-    return sum(heights[row, col] + 1 for row, col in locations)
+    rows, cols = local_minima(heights)
+    return int(heights[rows, cols].sum(dtype='int64')) + len(rows)
 
 
 
-def basins(heights: np.ndarray) -> np.ndarray:
+def label_components(free: np.ndarray) -> np.ndarray:
+    """Label 4-connected regions of True cells, return flat root index per cell
+
+    Vectorized union-find: hook the larger root onto the smaller across all
+    edges at once, then compress paths by pointer jumping, until stable.
+    Cells that are not free are their own root.
+    """
+    nr, nc = free.shape
+    index = np.arange(nr*nc).reshape(nr, nc)
+
+    # edges between horizontal and vertical free neighbors
+    horizontal = free[:, :-1] & free[:, 1:]
+    vertical = free[:-1, :] & free[1:, :]
+    src = np.concatenate([index[:, :-1][horizontal], index[:-1, :][vertical]])
+    dst = np.concatenate([index[:, 1:][horizontal], index[1:, :][vertical]])
+
+    parent = index.reshape(-1).copy()
 
-    labels = np.zeros(heights.shape, dtype='int')
-    queue = []
+    while True:
+        src_root = parent[src]
+        dst_root = parent[dst]
+        unmerged = src_root != dst_root
+        if not np.any(unmerged):
+            break
 
-    def assign(this: T.Tuple[int, int], label: int):
-        nonlocal labels
-        nonlocal queue
+        # drop edges that are already resolved, they stay that way
+        src, dst = src[unmerged], dst[unmerged]
+        src_root, dst_root = src_root[unmerged], dst_root[unmerged]
+        np.minimum.at(parent, np.maximum(src_root, dst_root), np.minimum(src_root, dst_root))
 
-        if labels[this] == 0 and heights[this] != 9:
-            labels[this] = label 
-            queue.extend([
-                ((this[0] + 0, this[1] - 1), label),
-                ((this[0] + 0, this[1] + 1), label),
-                ((this[0] - 1, this[1] + 0), label),
-                ((this[0] + 1, this[1] + 0), label),
-            ])
+        # compress paths so every cell points directly at its root
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+    return parent.reshape(nr, nc)
+
+
+def basins(heights: np.ndarray) -> np.ndarray:
+    """Return basin labels numbered from 1, ridges are labeled -1"""
 
-        
     # 9s and only 9s are the ridges dividing the basins
-    labels[heights == 9] = -1  
+    free = heights != 9
+    roots = label_components(free)
 
-    # minima each define thier own basin
-    minima = local_minima(heights)
-    for label, location in enumerate(minima, 1):
-        queue.append((location, label))    
-        
-    
-    # label everything
-    while queue:
-        assign(*queue.pop())
-        
-    return labels
+    # renumber roots as consecutive labels
+    _, labels = np.unique(roots[free], return_inverse=True)
+    basin_labels = np.full(heights.shape, -1, dtype='int')
+    basin_labels[free] = labels.reshape(-1) + 1
+
+    return basin_labels
 
 
 def basin_sizes(heights: np.ndarray) -> T.List[int]:
 
     basin_labels = basins(heights)
-    counts = Counter(basin_labels.reshape(-1))
-    del counts[-1]  # exclude ridges!
-    return sorted(counts.values(), reverse=True)
+    counts = np.bincount(basin_labels[basin_labels > 0])[1:]  # exclude ridges!
+    return sorted(counts.tolist(), reverse=True)
+
+
+class BandResult(T.NamedTuple):
+    """Partial results for one band of rows"""
+    risk: int
+    closed_sizes: T.List[int]  # largest basins that do not touch the band edges
+    open_sizes: T.Dict[int, int]  # global root -> size, for basins touching the band edges
+    top_labels: np.ndarray  # global root for each cell in the first row, -1 for ridges
+    bottom_labels: np.ndarray  # global root for each cell in the last row, -1 for ridges
+
+
+def input_layout(filename: str, chunk_size: int = 1 << 20) -> T.Tuple[int, int, int]:
+    """Return number of rows, number of columns, and bytes per line for a text heightmap"""
+    mapped = np.memmap(filename, dtype='uint8', mode='r')
+
+    # scan for the end of the first line a chunk at a time, however long it is
+    stride = mapped.size + 1
+    for offset in range(0, mapped.size, chunk_size):
+        line_end = np.flatnonzero(mapped[offset:offset + chunk_size] == ord('\n'))
+        if line_end.size:
+            stride = offset + int(line_end[0]) + 1
+            break
+
+    num_cols = stride - 1
+    if num_cols and mapped[num_cols - 1] == ord('\r'):
+        num_cols -= 1
+    num_rows = -(-mapped.size // stride)  # last line may lack a newline
+
+    # every line must be the same length, the last one may lack its newline
+    newline_size = stride - num_cols
+    same_length = mapped.size in (num_rows*stride, num_rows*stride - newline_size)
+    rows_per_chunk = max(1, chunk_size // stride)
+    for first in range(0, num_rows, rows_per_chunk):
+        if not same_length:
+            break
+        line_ends = mapped[first*stride + stride - 1:(first + rows_per_chunk)*stride:stride]
+        same_length = bool(np.all(line_ends == ord('\n')))
+    if not same_length:
+        raise ValueError(f'Lines in {filename} are not all {num_cols} characters long')
+
+    return num_rows, num_cols, stride
+
+
+def read_rows(filename: str, first: int, last: int, layout: T.Tuple[int, int, int]) -> np.ndarray:
+    """Return rows [first, last) of the heightmap, padded with 9s on all sides
+
+    Rows outside the heightmap are all 9s, so the halo rows requested at the
+    top and bottom edges look just like the usual pad.
+    """
+    num_rows, num_cols, stride = layout
+    mapped = np.memmap(filename, dtype='uint8', mode='r')
+
+    block = np.full((last - first, num_cols + 2), 9, dtype='uint8')
+    lo, hi = max(first, 0), min(last, num_rows)
+    if lo < hi:
+        raw = np.full((hi - lo)*stride, ord('\n'), dtype='uint8')
+        chunk = mapped[lo*stride:hi*stride]
+        raw[:chunk.size] = chunk
+        block[lo - first:hi - first, 1:-1] = raw.reshape(-1, stride)[:, :num_cols] - ord('0')
+    return block
+
+
+def analyze_band(filename: str, first: int, last: int, layout: T.Tuple[int, int, int], num_basins: int) -> BandResult:
+    """Compute minima and partial basin labels for rows [first, last)"""
+    num_cols = layout[1] + 2
+
+    # one-row halo on each side, so minima are exact at the band edges
+    heights = read_rows(filename, first - 1, last + 1, layout)
+    rows, cols = local_minima(heights)
+    risk = int(heights[rows, cols].sum(dtype='int64')) + len(rows)
+
+    # label basins within the band, roots are offset to global flat indices
+    band = heights[1:-1]
+    free = band != 9
+    roots = label_components(free)
+    global_roots = np.where(free, roots + first*num_cols, -1)
+
+    # basins touching the band edges may continue in the neighboring bands
+    edge_roots = np.unique(np.concatenate([global_roots[0], global_roots[-1]]))
+    edge_roots = edge_roots[edge_roots >= 0]
+
+    band_roots, sizes = np.unique(global_roots[free], return_counts=True)
+    is_open = np.isin(band_roots, edge_roots)
+
+    return BandResult(
+        risk=risk,
+        closed_sizes=nlargest(num_basins, sizes[~is_open].tolist()),
+        open_sizes=dict(zip(band_roots[is_open].tolist(), sizes[is_open].tolist())),
+        top_labels=global_roots[0],
+        bottom_labels=global_roots[-1],
+    )
+
+
+def banded_analysis(
+    filename: str, band_rows: int = 1024, num_basins: int = 3, num_workers: T.Optional[int] = None,
+) -> T.Tuple[int, T.List[int]]:
+    """Return total risk and largest basin sizes without loading the whole heightmap
+
+    The input file is memory-mapped and split into bands of rows, each analyzed
+    in a worker process with only a few bands in flight at once. Results are
+    merged in band order: basins that cross band edges are joined with a small
+    union-find over the edge rows, and a basin is closed as soon as it no longer
+    reaches the bottom edge of the latest band, so driver memory is bounded by
+    the row width rather than the file size.
+    """
+    layout = input_layout(filename)
+    num_rows = layout[0]
+    num_workers = num_workers or os.cpu_count() or 1
+
+    risk = 0
+    largest: T.List[int] = []
+    open_sizes: T.Dict[int, int] = {}  # root -> size, for basins reaching the previous bottom edge
+    parent: T.Dict[int, int] = {}
+    previous_bottom: T.Optional[np.ndarray] = None
+
+    def find(label: int) -> int:
+        root = label
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while label != root:
+            parent[label], label = root, parent.get(label, label)
+        return root
+
+    def merge(result: BandResult):
+        nonlocal risk, largest, open_sizes, parent, previous_bottom
+        risk += result.risk
+
+        # join basins that continue across the edge with the previous band
+        if previous_bottom is not None:
+            joined = (previous_bottom >= 0) & (result.top_labels >= 0)
+            for upper, lower in set(zip(previous_bottom[joined].tolist(), result.top_labels[joined].tolist())):
+                upper, lower = find(upper), find(lower)
+                if upper != lower:
+                    parent[max(upper, lower)] = min(upper, lower)
+
+        sizes: T.Dict[int, int] = Counter()
+        for label, size in open_sizes.items():
+            sizes[find(label)] += size
+        for label, size in result.open_sizes.items():
+            sizes[find(label)] += size
+
+        # only basins reaching the new bottom edge can still grow, the rest are closed
+        bottom = np.unique(result.bottom_labels[result.bottom_labels >= 0]).tolist()
+        live = {x: find(x) for x in bottom}
+        live_roots = set(live.values())
+        closed = [size for root, size in sizes.items() if root not in live_roots]
+        largest = nlargest(num_basins, largest + result.closed_sizes + closed)
+
+        open_sizes = {root: sizes[root] for root in live_roots}
+        parent = {label: root for label, root in live.items() if label != root}
+        previous_bottom = result.bottom_labels
+
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        pending: T.Deque = deque()
+        for first in range(0, num_rows, band_rows):
+            last = min(first + band_rows, num_rows)
+            pending.append(pool.submit(analyze_band, filename, first, last, layout, num_basins))
+            if len(pending) >= 2*num_workers:
+                merge(pending.popleft().result())
+        while pending:
+            merge(pending.popleft().result())
+
+    return risk, nlargest(num_basins, largest + list(open_sizes.values()))
 
 
 if __name__ == '__main__':
@@ -95,6 +282,12 @@ if __name__ == '__main__':
     print(f'Product of top 3 sizes: {prod(top_3_sizes)}')
     print()
 
+    print('banded ----------')
+    risk, top_3_sizes = banded_analysis(input_file, band_rows=16)
+    print(f'Total risk at low points is: {risk}')
+    print(f'Product of top 3 sizes: {prod(top_3_sizes)}')
+    print()
+
     
     
 
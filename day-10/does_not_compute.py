@@ -1,4 +1,8 @@
+import numpy as np
+import os
 import typing as T
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from types import MappingProxyType
 
 
@@ -37,55 +41,169 @@ SUFFIX_SCORES = MappingProxyType(
 
 
 
-def first_invalid_character(line: str) -> T.Optional[str]:
-    """Return first invalid character, if any"""
-    opened = []
-    for char in line:
-        if char in OPENERS:
-            opened.append(char)
-        else:
-            if opened and char == OPENERS[opened[-1]]:
-                opened.pop(-1)
-            else:
-                # this is the first invalid char!
-                return char
+class SyntaxCheck(T.NamedTuple):
+    """Result of checking one line"""
+    status: str  # one of 'corrupted', 'incomplete', 'valid'
+    invalid_char: T.Optional[str]
+    suffix_score: int
 
 
-def complete_suffix(line: str) -> T.Optional[str]:
-    """Return missing suffix that makes the incomplete string valid"""
-    # screen out invalid lines, isolate the un-completed prefix
-    opened = []
+def _scan(line: str) -> T.Tuple[T.Optional[str], bytearray, int]:
+    """Return first invalid character (if any), and the stack of expected closers and its depth"""
+    # at most one closer per character, so the stack never needs to grow
+    expected = bytearray(len(line))
+    depth = 0
     for char in line:
-        if char in OPENERS:
-            opened.append(char)
+        closer = OPENERS.get(char)
+        if closer is not None:
+            expected[depth] = ord(closer)
+            depth += 1
+        elif depth and ord(char) == expected[depth - 1]:
+            # paired, remove from stack
+            depth -= 1
         else:
-            if opened and char == OPENERS[opened[-1]]:
-                # paired, remove from queue
-                opened.pop(-1)
-            else:
-                # invalid, we are done here
-                return None
-
-    # complete each unpaired character
-    suffix = []
-    for char in reversed(opened):
-        suffix.append(OPENERS[char])
+            # this is the first invalid char!
+            return char, expected, depth
+    return None, expected, depth
 
-    return ''.join(suffix)
 
+def check_syntax(line: str) -> SyntaxCheck:
+    """Classify line, and return its first invalid character or completion score in one pass"""
+    invalid_char, expected, depth = _scan(line)
 
-def score_suffix(line: str) -> int:
-    chars = complete_suffix(line)
+    if invalid_char is not None:
+        return SyntaxCheck('corrupted', invalid_char, 0)
 
-    if chars is None:
-        return 0
+    if depth == 0:
+        return SyntaxCheck('valid', None, 0)
 
+    # complete each unpaired character, innermost first
     score = 0
-    for char in chars:
-        score = score*5 + SUFFIX_SCORES[char]
-    return score
+    for idx in range(depth - 1, -1, -1):
+        score = score*5 + SUFFIX_SCORES[chr(expected[idx])]
+    return SyntaxCheck('incomplete', None, score)
+
+
+def first_invalid_character(line: str) -> T.Optional[str]:
+    """Return first invalid character, if any"""
+    return _scan(line)[0]
+
+
+def complete_suffix(line: str) -> T.Optional[str]:
+    """Return missing suffix that makes the incomplete string valid"""
+    invalid_char, expected, depth = _scan(line)
+    if invalid_char is not None:
+        return None
+    return expected[depth - 1::-1].decode() if depth else ''
+
+
+def score_suffix(line: str) -> int:
+    return check_syntax(line).suffix_score
 
 
+def median_score(scores: T.Sequence[int]) -> int:
+    """Return middle score by selection rather than a full sort, 0 if there are no scores"""
+    if len(scores) == 0:
+        return 0
+    # scores for very long lines overflow int64, fall back to python ints
+    dtype = object if max(scores) > np.iinfo('int64').max else 'int64'
+    middle = len(scores)//2
+    return int(np.partition(np.array(scores, dtype=dtype), middle)[middle])
+
+
+def _byte_table(mapping: T.Mapping[str, T.Union[str, int]]) -> T.Tuple[int, ...]:
+    """Return 256-entry lookup table indexed by byte value, 0 for missing keys"""
+    table = [0]*256
+    for key, value in mapping.items():
+        if key is not None:
+            table[ord(key)] = ord(value) if isinstance(value, str) else value
+    return tuple(table)
+
+
+# byte-indexed versions of the tables above, for the bulk checker
+CLOSER_TABLE = bytes(_byte_table(OPENERS))
+INVALID_CHAR_SCORE_TABLE = _byte_table(INVALID_CHAR_SCORES)
+SUFFIX_SCORE_TABLE = _byte_table(SUFFIX_SCORES)
+
+
+def check_block(block: bytes) -> T.Tuple[int, T.List[int]]:
+    """Check every line in block, return total corruption score and list of completion scores"""
+    closers = CLOSER_TABLE
+    invalid_scores = INVALID_CHAR_SCORE_TABLE
+    suffix_scores = SUFFIX_SCORE_TABLE
+
+    corrupted_score = 0
+    completion_scores = []
+
+    for line in block.split(b'\n'):
+        line = line.strip()
+        expected = bytearray(len(line))
+        depth = 0
+        for code in line:
+            closer = closers[code]
+            if closer:
+                expected[depth] = closer
+                depth += 1
+            elif depth and code == expected[depth - 1]:
+                depth -= 1
+            else:
+                corrupted_score += invalid_scores[code]
+                break
+        else:
+            if depth:
+                score = 0
+                for idx in range(depth - 1, -1, -1):
+                    score = score*5 + suffix_scores[expected[idx]]
+                completion_scores.append(score)
+
+    return corrupted_score, completion_scores
+
+
+def read_blocks(filename: str, block_size: int) -> T.Iterator[bytes]:
+    """Yield blocks of about block_size bytes from file, split on line boundaries"""
+    with open(filename, 'rb') as fp:
+        remainder = b''
+        while True:
+            chunk = fp.read(block_size)
+            if not chunk:
+                break
+            chunk = remainder + chunk
+            split = chunk.rfind(b'\n') + 1
+            if split == 0:
+                remainder = chunk
+                continue
+            remainder = chunk[split:]
+            yield chunk[:split]
+        if remainder:
+            yield remainder
+
+
+def bulk_check(filename: str, block_size: int = 1 << 23, num_workers: T.Optional[int] = None) -> T.Tuple[int, int]:
+    """Return total corruption score and median completion score for a whole file
+
+    Blocks of lines are checked in a process pool, with only a few blocks in
+    flight at once so memory use does not grow with the file size.
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    corrupted_score = 0
+    completion_scores: T.List[int] = []
+
+    def merge(partial: T.Tuple[int, T.List[int]]):
+        nonlocal corrupted_score
+        corrupted_score += partial[0]
+        completion_scores.extend(partial[1])
+
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        pending: T.Deque = deque()
+        for block in read_blocks(filename, block_size):
+            pending.append(pool.submit(check_block, block))
+            if len(pending) >= 2*num_workers:
+                merge(pending.popleft().result())
+        while pending:
+            merge(pending.popleft().result())
+
+    return corrupted_score, median_score(completion_scores)
+
 
 if __name__ == '__main__':
     
@@ -93,15 +211,18 @@ if __name__ == '__main__':
     input_file = 'input.txt'
 
     data = parse_input(input_file) 
+    checks = [check_syntax(x) for x in data]
 
     print('puzzle 1 ----------')
-    invalid_line_score = sum(INVALID_CHAR_SCORES[first_invalid_character(x)] for x in data) 
+    invalid_line_score = sum(INVALID_CHAR_SCORES[x.invalid_char] for x in checks) 
     print(f'Score for invalid lines = {invalid_line_score}')
 
     print('puzzle 2 ----------')
-    suffixes = [complete_suffix(x) for x in data]
-    scores = [score_suffix(x) for x in data]
-    sorted_scores = sorted(x for x in scores if x != 0)
-    winning_score = sorted_scores[len(sorted_scores)//2]
+    scores = [x.suffix_score for x in checks if x.status == 'incomplete']
+    winning_score = median_score(scores)
     print(f'Score for line suffixes = {winning_score}')
 
+    print('bulk ----------')
+    invalid_line_score, winning_score = bulk_check(input_file)
+    print(f'Score for invalid lines = {invalid_line_score}')
+    print(f'Score for line suffixes = {winning_score}')
@@ -15,71 +15,158 @@ def parse_input(filename: str) -> np.ndarray:
     return np.pad(data_array, 1, 'constant', constant_values=0)
 
 
-def timestep(power: np.ndarray) -> T.Tuple[np.ndarray, int]:
+def timestep(power: np.ndarray) -> T.Tuple[np.ndarray, T.Union[int, np.ndarray]]:
     """Advance powerpus state by one timestep, return new powerpus state and number of flashes
-    """
-    nr, nc = power.shape
 
+    Accepts a single padded grid with shape (R, C) or a stack of them with shape
+    (B, R, C), in which case the number of flashes is an array with one entry per grid.
+    """
     # "flashed" array tracks which octopi have flashed this turn
     #   the boundary pad is treated as though it contains "flashed" octopuses
-    flashed = np.ones((nr, nc), dtype='bool')
-    flashed[1:nr-1, 1:nc-1] = False
+    flashed = np.ones(power.shape, dtype='bool')
+    flashed[..., 1:-1, 1:-1] = False
 
     # increment the power level of all octopi (i.e., move time forward)
     power = power + 1
 
     # resolve flashes and their cascades
-    flash_count = 0
+    flash_count = np.zeros(power.shape[:-2], dtype='int')
 
     while True:
         new_flashes = (power > 9) & ~flashed
-        new_flash_count = np.sum(new_flashes)
 
-        if new_flash_count == 0: 
+        if not np.any(new_flashes): 
             break
         
-        flash_count += new_flash_count
+        flash_count += np.sum(new_flashes, axis=(-2, -1))
 
-        rows, cols = np.nonzero(new_flashes)
-        
-        for row, col in zip(rows, cols):
-            power[row-1:row+2, col-1:col+2] += 1
+        # count flashing neighbors of every interior octopus with a separable 3x3 sum,
+        #   the pad never flashes, so the interior is all that changes
+        flashes = new_flashes.astype(power.dtype)
+        row_sums = flashes[..., :-2, :] + flashes[..., 1:-1, :] + flashes[..., 2:, :]
+        power[..., 1:-1, 1:-1] += row_sums[..., :-2] + row_sums[..., 1:-1] + row_sums[..., 2:]
 
-        flashed[new_flashes] = True
+        flashed |= new_flashes
 
     # reset all flashed octopuses
     power[flashed] = 0
     
-    return power, flash_count
+    return power, (int(flash_count) if flash_count.ndim == 0 else flash_count)
 
 
 
-def total_flashes(power: np.ndarray, num_steps: int) -> int:
+def total_flashes(power: np.ndarray, num_steps: int) -> T.Union[int, np.ndarray]:
+    """Return number of flashes after num_steps, per grid if given a (B, R, C) stack"""
     
     modeled_power = np.copy(power)
-    flash_count = 0
+    flash_count = np.zeros(power.shape[:-2], dtype='int')
 
     for _ in range(num_steps):
         modeled_power, new_flash_count = timestep(modeled_power)
         flash_count += new_flash_count
 
-    return flash_count
+    return int(flash_count) if flash_count.ndim == 0 else flash_count
 
 
-def first_sync_flash(power: np.ndarray, max_num_steps: int) -> int:
-    
-    modeled_power = np.copy(power)
-    nr, nc = power.shape
+def first_sync_flash(power: np.ndarray, max_num_steps: int) -> T.Union[int, np.ndarray]:
+    """Return first step where all octopi flash, per grid if given a (B, R, C) stack
+
+    Grids that have synchronized are dropped from the stack, so the remaining
+    steps only model the grids that are still going. For a stack, grids that do
+    not synchronize within max_num_steps get 0; a single grid raises instead.
+    """
+    batched = power.ndim == 3
+    modeled_power = np.copy(power if batched else power[np.newaxis])
+    nr, nc = power.shape[-2:]
     num_octopi = (nr-2)*(nc-2)  # account for pad
 
+    sync_step = np.zeros(modeled_power.shape[0], dtype='int')
+    active = np.arange(modeled_power.shape[0])
+
     for t in range(max_num_steps):
+        if active.size == 0:
+            break
         modeled_power, flash_count = timestep(modeled_power)
-        print((t, flash_count, num_octopi))
-        if flash_count == num_octopi:
-            return t+1
+        synced = flash_count == num_octopi
+        if np.any(synced):
+            sync_step[active[synced]] = t+1
+            active = active[~synced]
+            modeled_power = modeled_power[~synced]
+
+    if active.size and not batched:
+        raise ValueError('they never did!')
+
+    return sync_step if batched else int(sync_step[0])
+
 
-    raise ValueError('they never did!')
 
+class Cycle(T.NamedTuple):
+    """Repeating stretch of a simulation, states after step start and start+length are equal"""
+    start: int
+    length: int
+
+
+class CycleSearch(T.NamedTuple):
+    """Outcome of searching a simulation for a cycle"""
+    cycle: T.Optional[Cycle]
+    flash_counts: T.List[int]  # cumulative flashes after each simulated step, starting from 0
+    power: np.ndarray  # state after the last simulated step
+
+
+def find_cycle(power: np.ndarray, max_num_steps: int) -> CycleSearch:
+    """Search the simulation of a single grid for its first cycle, for at most max_num_steps
+
+    States are keyed by hash, and a hash match is verified against the stored state
+    before it counts as a repeat. Every state is stored until a repeat is found, so
+    max_num_steps also bounds memory use.
+    """
+    modeled_power = np.copy(power)
+    flash_counts = [0]
+    states = [modeled_power.tobytes()]
+    seen: T.Dict[int, T.List[int]] = {hash(states[0]): [0]}
+
+    for t in range(1, max_num_steps + 1):
+        modeled_power, new_flash_count = timestep(modeled_power)
+        flash_counts.append(flash_counts[-1] + new_flash_count)
+
+        state = modeled_power.tobytes()
+        key = hash(state)
+        for prior in seen.get(key, []):
+            if states[prior] == state:
+                return CycleSearch(Cycle(prior, t - prior), flash_counts, modeled_power)
+
+        seen.setdefault(key, []).append(t)
+        states.append(state)
+
+    return CycleSearch(None, flash_counts, modeled_power)
+
+
+def extrapolated_flashes(
+    power: np.ndarray, num_steps: int, max_search_steps: int = 10_000, max_fallback_steps: int = 10_000,
+) -> int:
+    """Return number of flashes after num_steps, extrapolated from the first cycle
+
+    Cycles are only searched for in the first max_search_steps. If none is found,
+    up to max_fallback_steps more are simulated step by step without storing
+    states, and beyond that a ValueError is raised rather than simulating on.
+    """
+    cycle, counts, modeled_power = find_cycle(power, min(num_steps, max_search_steps))
+
+    if cycle is None:
+        num_remaining = num_steps - (len(counts) - 1)
+        if num_remaining > max_fallback_steps:
+            raise ValueError(
+                f'No cycle in the first {max_search_steps} steps, and {num_remaining} steps '
+                f'are too many to simulate one by one'
+            )
+        return counts[-1] + total_flashes(modeled_power, num_remaining)
+
+    if num_steps <= cycle.start + cycle.length:
+        return counts[num_steps]
+
+    per_cycle = counts[cycle.start + cycle.length] - counts[cycle.start]
+    num_cycles, remainder = divmod(num_steps - cycle.start, cycle.length)
+    return counts[cycle.start + remainder] + num_cycles*per_cycle
 
 
 if __name__ == '__main__':
@@ -97,3 +184,7 @@ if __name__ == '__main__':
     print('puzzle 2 ----------')
     print(f'The first sychronized flash occurs at steps: {first_sync_flash(octopi, 1000)}')
     
+
+    print('puzzle 3 ----------')
+    num_time_steps = 10**12
+    print(f'number of flashes after {num_time_steps} steps: {extrapolated_flashes(octopi, num_time_steps)}')
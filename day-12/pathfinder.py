@@ -1,9 +1,17 @@
+import numpy as np
 import typing as T
 import attr
+import multiprocessing as mp
+import os
+import queue as queue_module
+import traceback
+from collections import Counter
+from functools import lru_cache
 
 
 START_NAME = 'start'
 END_NAME = 'end'
+ENDPOINT_NAMES = frozenset({START_NAME, END_NAME})
 
 
 
@@ -17,18 +25,20 @@ class Cave:
 
     name: str = attr.ib()
     nbrs: T.List['Cave'] = attr.ib(factory=list)
+    is_small: bool = attr.ib(init=False)
+    is_endpoint: bool = attr.ib(init=False)
 
     def __attr_post_init__(self):
         if not (self.name.isupper() or self.name.islower()):
             raise ValueError('Mixed case name is not allowed!')
 
-    @property
-    def is_small(self):
+    @is_small.default
+    def _find_is_small(self):
         return self.name.islower()
 
-    @property
-    def is_endpoint(self):
-        return self.name in {START_NAME, END_NAME}
+    @is_endpoint.default
+    def _find_is_endpoint(self):
+        return self.name in ENDPOINT_NAMES
 
     def add_neighbor(self, other: 'Cave'):
         self.nbrs.append(other)
@@ -74,7 +84,93 @@ class Path:
 
 
 
+@attr.frozen
+class CaveGraph:
+    """Compact cave graph with integer ids
+
+    Small caves get ids 0..num_small-1, so visited sets fit in a bitmask, and
+    big caves follow. Neighbors are stored CSR-style: the neighbors of cave i
+    are indices[indptr[i]:indptr[i+1]]. The collapsed graph has small caves
+    only, with big caves replaced by weighted small-to-small edges.
+    """
+
+    names: T.Tuple[str, ...] = attr.ib()
+    indptr: np.ndarray = attr.ib()
+    indices: np.ndarray = attr.ib()
+    is_small: np.ndarray = attr.ib()
+    is_endpoint: np.ndarray = attr.ib()
+    start: int = attr.ib()
+    end: int = attr.ib()
+    small_indptr: np.ndarray = attr.ib()
+    small_indices: np.ndarray = attr.ib()
+    small_weights: np.ndarray = attr.ib()
+
+    @classmethod
+    def from_edges(cls, edges: T.Iterable[T.Tuple[str, str]]) -> 'CaveGraph':
+        edges = list(edges)
+        all_names = {name for edge in edges for name in edge}
+        for name in all_names:
+            if not (name.isupper() or name.islower()):
+                raise ValueError('Mixed case name is not allowed!')
+
+        # small caves first, so their ids are also their bit positions
+        names = tuple(sorted(all_names, key=lambda x: (not x.islower(), x)))
+        ids = {name: idx for idx, name in enumerate(names)}
+        num_small = sum(1 for x in names if x.islower())
+
+        adjacency: T.List[T.List[int]] = [[] for _ in names]
+        for first, second in edges:
+            adjacency[ids[first]].append(ids[second])
+            adjacency[ids[second]].append(ids[first])
+
+        # paths through a big cave only multiply counts, so replace each big cave
+        #   with weighted edges between all pairs of its (small) neighbors
+        small_edges: T.List[Counter] = [Counter() for _ in range(num_small)]
+        for cave in range(num_small):
+            for nbr in adjacency[cave]:
+                if nbr < num_small:
+                    small_edges[cave][nbr] += 1
+                    continue
+                for nbr_of_nbr in adjacency[nbr]:
+                    if nbr_of_nbr >= num_small:
+                        raise ValueError('Adjacent big caves allow infinitely many paths!')
+                    small_edges[cave][nbr_of_nbr] += 1
+
+        def to_csr(rows: T.List[T.List[int]]) -> T.Tuple[np.ndarray, np.ndarray]:
+            indptr = np.cumsum([0] + [len(x) for x in rows]).astype('int32')
+            indices = np.array([x for row in rows for x in row], dtype='int32')
+            return indptr, indices
+
+        indptr, indices = to_csr(adjacency)
+        small_indptr, small_indices = to_csr([list(x.keys()) for x in small_edges])
+        small_weights = np.array([x for row in small_edges for x in row.values()], dtype='int64')
+
+        return cls(
+            names=names,
+            indptr=indptr,
+            indices=indices,
+            is_small=np.arange(len(names)) < num_small,
+            is_endpoint=np.array([x in ENDPOINT_NAMES for x in names], dtype='bool'),
+            start=ids[START_NAME],
+            end=ids[END_NAME],
+            small_indptr=small_indptr,
+            small_indices=small_indices,
+            small_weights=small_weights,
+        )
+
+    def neighbors(self, cave: int) -> np.ndarray:
+        return self.indices[self.indptr[cave]:self.indptr[cave + 1]]
+
+
+
+def parse_graph(filename: str) -> CaveGraph:
+    """Return the compact integer cave graph, which all traversal algorithms run on"""
+    with open(filename, 'r') as fp:
+        return CaveGraph.from_edges(tuple(line.strip().split('-')) for line in fp if line.strip())
+
+
 def parse_input(filename: str) -> T.Tuple[Cave, T.List[Cave], Cave]:
+    """Return start cave, other caves, and end cave as linked Cave objects"""
    # map name to cave object 
     objs = dict()
     
@@ -101,32 +197,175 @@ def parse_input(filename: str) -> T.Tuple[Cave, T.List[Cave], Cave]:
 
 
 
-def count_unique_paths(start: Cave, allow_revisits: bool) -> int:
-
-    complete_paths = 0 
-
-    open_paths = [Path([start], allow_revisits)]
-
-    while open_paths:
-    
-        current_path = open_paths.pop()
-        
-        for next_step in current_path.steps[-1].nbrs:
-            try: 
-                new_path = current_path.add_step(next_step)
-                if new_path.complete:
-                    complete_paths += 1
-                else:
-                    open_paths.append(new_path)
-            except RevisitError:
-                pass
-
-    return complete_paths
+def count_unique_paths(graph: CaveGraph, allow_revisits: bool) -> int:
+    """Count unique paths by enumerating each one, see count_paths for the fast version"""
+    return sum(1 for _ in enumerate_paths(graph, allow_revisits))
+
+
+
+def count_paths(graph: CaveGraph, allow_revisits: bool) -> int:
+    """Count unique paths without enumerating them
+
+    Runs on the collapsed small-cave graph, with visited small caves tracked
+    as a bitmask, so counts can be memoized on (cave, visited, can revisit).
+    """
+    nbrs = [
+        tuple(zip(
+            graph.small_indices[lo:hi].tolist(),
+            graph.small_weights[lo:hi].tolist(),
+        ))
+        for lo, hi in zip(graph.small_indptr[:-1].tolist(), graph.small_indptr[1:].tolist())
+    ]
+    is_endpoint = graph.is_endpoint.tolist()
+    end = graph.end
+
+    @lru_cache(maxsize=None)
+    def count_from(current: int, visited: int, can_revisit: bool) -> int:
+        if current == end:
+            return 1
+
+        total = 0
+        for nbr, weight in nbrs[current]:
+            bit = 1 << nbr
+            if not visited & bit:
+                total += weight*count_from(nbr, visited | bit, can_revisit)
+            elif can_revisit and not is_endpoint[nbr]:
+                total += weight*count_from(nbr, visited, False)
+        return total
+
+    return count_from(graph.start, 1 << graph.start, allow_revisits)
+
+
+def enumerate_paths(
+    graph: CaveGraph, allow_revisits: bool, first_hops: T.Optional[T.Sequence[int]] = None,
+) -> T.Iterator[np.ndarray]:
+    """Yield each unique path lazily as an array of cave ids, from start to end
+
+    Uses an explicit stack of (cave, next neighbor index) frames, so only the
+    current path is held in memory. If first_hops is given, only paths whose
+    second cave is one of them are produced.
+    """
+    nbrs = [graph.neighbors(cave).tolist() for cave in range(len(graph.names))]
+    if first_hops is not None:
+        allowed = set(first_hops)
+        nbrs[graph.start] = [x for x in nbrs[graph.start] if x in allowed]
+    is_small = graph.is_small.tolist()
+    is_endpoint = graph.is_endpoint.tolist()
+    end = graph.end
+
+    visits = [0]*len(graph.names)
+    visits[graph.start] = 1
+    path = [graph.start]
+    next_idx = [0]
+    revisit_depth = -1  # depth of the small cave that used up the revisit, if any
+
+    while path:
+        depth = len(path) - 1
+        current = path[depth]
+        idx = next_idx[depth]
+
+        if idx == len(nbrs[current]):
+            # all neighbors done, backtrack
+            if is_small[current]:
+                visits[current] -= 1
+            if revisit_depth == depth:
+                revisit_depth = -1
+            path.pop()
+            next_idx.pop()
+            continue
+
+        next_idx[depth] = idx + 1
+        nbr = nbrs[current][idx]
+
+        if is_small[nbr] and visits[nbr]:
+            if allow_revisits and revisit_depth < 0 and not is_endpoint[nbr]:
+                revisit_depth = depth + 1
+            else:
+                continue
+
+        if nbr == end:
+            yield np.array(path + [end], dtype='int32')
+            continue
+
+        path.append(nbr)
+        next_idx.append(0)
+        if is_small[nbr]:
+            visits[nbr] += 1
+
+
+def _enumerate_worker(
+    graph: CaveGraph, allow_revisits: bool, first_hops: T.List[int], queue: mp.Queue, batch_size: int,
+):
+    """Put batches of paths for the given first hops on queue, then None when done
+
+    If enumeration fails, the formatted traceback is put on the queue as a string
+    instead, so the parent can raise rather than wait for a sentinel that never comes.
+    """
+    try:
+        batch = []
+        for path in enumerate_paths(graph, allow_revisits, first_hops):
+            batch.append(path)
+            if len(batch) == batch_size:
+                queue.put(batch)
+                batch = []
+        if batch:
+            queue.put(batch)
+    except BaseException:
+        queue.put(traceback.format_exc())
+        return
+    queue.put(None)
+
+
+def enumerate_paths_parallel(
+    graph: CaveGraph, allow_revisits: bool, num_workers: T.Optional[int] = None, batch_size: int = 4096,
+    poll_interval: float = 1.0,
+) -> T.Iterator[np.ndarray]:
+    """Yield each unique path, enumerated in worker processes split by first hop
+
+    Paths are streamed back in batches through a bounded queue, so the caller
+    can write them out as they arrive. Order across first hops is not defined.
+    Raises RuntimeError if a worker fails or dies.
+    """
+    first_hops = sorted(set(graph.neighbors(graph.start).tolist()))
+    num_workers = min(num_workers or os.cpu_count() or 1, len(first_hops))
+    if num_workers == 0:
+        return
+
+    queue = mp.Queue(maxsize=4*num_workers)
+    workers = [
+        mp.Process(
+            target=_enumerate_worker,
+            args=(graph, allow_revisits, first_hops[idx::num_workers], queue, batch_size),
+            daemon=True,
+        )
+        for idx in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        num_running = num_workers
+        while num_running:
+            try:
+                batch = queue.get(timeout=poll_interval)
+            except queue_module.Empty:
+                # a worker that was killed outright never reports back, so check on them
+                dead = [x.exitcode for x in workers if x.exitcode not in (None, 0)]
+                if dead:
+                    raise RuntimeError(f'Path enumeration worker died with exit code {dead[0]}')
+                continue
+            if batch is None:
+                num_running -= 1
+                continue
+            if isinstance(batch, str):
+                raise RuntimeError(f'Path enumeration worker failed:\n{batch}')
+            yield from batch
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
 
-        
-        
-            
-                        
 
 if __name__ == '__main__':
     
@@ -135,18 +374,23 @@ if __name__ == '__main__':
     #input_file = 'test_input_2.txt'
     input_file = 'input.txt'
 
-    start_cave, caves, end_cave = parse_input(input_file) 
+    graph = parse_graph(input_file)
 
     print('puzzle 1 ----------')
-    unique_paths_no_revisits = count_unique_paths(start_cave, allow_revisits=False)
+    unique_paths_no_revisits = count_paths(graph, allow_revisits=False)
     print(f'Number of unique paths without revisits: {unique_paths_no_revisits}')
     print()
 
     print('puzzle 2 ----------')
-    unique_paths_with_revisits = count_unique_paths(start_cave, allow_revisits=True)
+    unique_paths_with_revisits = count_paths(graph, allow_revisits=True)
     print(f'Number of unique paths with revisits: {unique_paths_with_revisits}')
     print()
 
+    print('enumerated ----------')
+    num_paths = sum(1 for _ in enumerate_paths_parallel(graph, allow_revisits=True))
+    print(f'Number of unique paths with revisits: {num_paths}')
+    print()
+
 
             
             
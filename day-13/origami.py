@@ -3,6 +3,44 @@ import numpy as np
 import attr
 
 
+GLYPH_WIDTH = 4
+GLYPH_HEIGHT = 6
+GLYPH_SPACING = 1
+
+# known letters, as drawn by the puzzle (rows separated by spaces)
+GLYPHS = {
+    'A': '.##. #..# #..# #### #..# #..#',
+    'B': '###. #..# ###. #..# #..# ###.',
+    'C': '.##. #..# #... #... #..# .##.',
+    'E': '#### #... ###. #... #... ####',
+    'F': '#### #... ###. #... #... #...',
+    'G': '.##. #..# #... #.## #..# .###',
+    'H': '#..# #..# #### #..# #..# #..#',
+    'I': '.### ..#. ..#. ..#. ..#. .###',
+    'J': '..## ...# ...# ...# #..# .##.',
+    'K': '#..# #.#. ##.. #.#. #.#. #..#',
+    'L': '#... #... #... #... #... ####',
+    'O': '.##. #..# #..# #..# #..# .##.',
+    'P': '###. #..# #..# ###. #... #...',
+    'R': '###. #..# #..# ###. #.#. #..#',
+    'S': '.### #... #... .##. ...# ###.',
+    'U': '#..# #..# #..# #..# #..# .##.',
+    'Z': '#### ...# ..#. .#.. #... ####',
+}
+
+
+def glyph_key(cells: np.ndarray) -> np.ndarray:
+    """Return integer key for each (GLYPH_HEIGHT, GLYPH_WIDTH) cell in a stack of 0/1 cells"""
+    weights = np.left_shift(1, np.arange(GLYPH_HEIGHT*GLYPH_WIDTH - 1, -1, -1, dtype='int64'))
+    return cells.reshape(-1, GLYPH_HEIGHT*GLYPH_WIDTH).astype('int64') @ weights
+
+
+GLYPH_KEYS = {
+    int(glyph_key(np.array([x == '#' for x in drawing.replace(' ', '')], dtype='uint8'))[0]): letter
+    for letter, drawing in GLYPHS.items()
+}
+
+
 @attr.frozen
 class Fold:
     axis: str
@@ -18,72 +56,148 @@ class Dot:
         return f'{self.__class__.__name__}({self.x}, {self.y})'
 
 
-@attr.frozen
+def unique_dots(coords: np.ndarray) -> np.ndarray:
+    """Return (N, 2) array of x, y coordinates with duplicate dots removed
+
+    Each dot is packed into one 64-bit key, which is much faster to deduplicate
+    than rows of a 2D array.
+    """
+    coords = np.asarray(coords, dtype='int64').reshape(-1, 2)
+    if coords.shape[0] == 0:
+        return coords
+    offset = coords.min(axis=0)
+    shifted = coords - offset
+    keys = np.unique((shifted[:, 0] << 32) | shifted[:, 1])
+    return np.column_stack([keys >> 32, keys & 0xFFFFFFFF]) + offset
+
+
+def _to_coords(dots: T.Union[np.ndarray, T.Iterable[Dot]]) -> np.ndarray:
+    if not isinstance(dots, np.ndarray):
+        dots = np.array([(dot.x, dot.y) for dot in dots], dtype='int64')
+    return unique_dots(dots)
+
+
+@attr.frozen(eq=False)
 class Page:
+    """Page with its dots stored as an (N, 2) array of x, y coordinates"""
 
-    dots: T.Set[Dot] = attr.ib(converter=set)
+    coords: np.ndarray = attr.ib(converter=_to_coords)
+    size: T.Tuple[int, int] = attr.ib(init=False)
+
+    @size.default
+    def _find_size(self) -> T.Tuple[int, int]:
+        """Dimensions of the page (needed to accomodate its dots) as x, y"""
+        if self.coords.shape[0] == 0:
+            return 1, 1
+        x_max, y_max = self.coords.max(axis=0).tolist()
+        return x_max + 1, y_max + 1
+
+    def __eq__(self, other) -> bool:
+        # coords are sorted and deduplicated, so equal dot sets have equal arrays
+        if not isinstance(other, Page):
+            return NotImplemented
+        return np.array_equal(self.coords, other.coords)
 
     @property
     def num_dots(self):
-        return len(self.dots)
+        return self.coords.shape[0]
 
     @property
-    def size(self) -> T.Tuple[int, int]:
-        """Dimensions of the page (needed to accomodate its dots) as x, y"""
-        x_max = y_max = 0
-        for dot in self.dots:
-            x_max = max(x_max, dot.x)
-            y_max = max(y_max, dot.y)
-        return x_max +1, y_max + 1
+    def dots(self) -> T.Set[Dot]:
+        return {Dot(x, y) for x, y in self.coords.tolist()}
 
-    def display(self) -> None:
-        """Print a neat-and-tidy ASCII representation of the page"""
+    def bitmap(self) -> np.ndarray:
+        """Return (ny, nx) uint8 array, 1 where there is a dot"""
         nx, ny = self.size
+        data = np.zeros((ny, nx), dtype='uint8')
+        data[self.coords[:, 1], self.coords[:, 0]] = 1
+        return data
 
-        data = [['.' for _ in range(nx)] for __ in range(ny)]
-        
-        for dot in self.dots:
-            data[dot.y][dot.x] = '#'
+    def display(self) -> None:
+        """Print a neat-and-tidy ASCII representation of the page"""
+        data = np.where(self.bitmap(), '#', '.')
         
         print()
         for row in data:
             print(''.join(row))
         print()
 
+    def read_code(self) -> str:
+        """Return the letters spelled out by the dots on a fully-folded page"""
+        data = self.bitmap()
+        ny, nx = data.shape
+        if ny > GLYPH_HEIGHT:
+            raise ValueError(f'Page is too tall to hold one row of letters: {ny}')
+
+        # pad out to a whole number of letter cells, then slice them all at once
+        cell_width = GLYPH_WIDTH + GLYPH_SPACING
+        num_cells = -(-nx // cell_width)
+        data = np.pad(data, ((0, GLYPH_HEIGHT - ny), (0, num_cells*cell_width - nx)))
+        cells = data.reshape(GLYPH_HEIGHT, num_cells, cell_width)[:, :, :GLYPH_WIDTH].transpose(1, 0, 2)
+
+        letters = []
+        for idx, key in enumerate(glyph_key(cells).tolist()):
+            if key not in GLYPH_KEYS:
+                raise ValueError(f'Letter {idx} does not match any known glyph')
+            letters.append(GLYPH_KEYS[key])
+        return ''.join(letters)
+
     def fold_me(self, instruction: Fold) -> 'Page':
         """Return a new folded version of this page"""
 
-        if instruction.axis == 'x':
-            new_dots = set()
-            for dot in self.dots:
-                if dot.x < instruction.location:
-                    # left of the fold, add 
-                    new_dots.add(dot)
-                elif dot.x == instruction.location:
-                    # on the fold, drop it
-                    continue
-                else:
-                    # right of the fold, transform and add
-                    new_dots.add(Dot(2*instruction.location - dot.x, dot.y))
-            return Page(new_dots)
-
-        elif instruction.axis == 'y':
-            new_dots = set()
-            for dot in self.dots:
-                if dot.y < instruction.location:
-                    # above the fold, add 
-                    new_dots.add(dot)
-                elif dot.y == instruction.location:
-                    # on the fold, drop it
-                    continue
-                else:
-                    # below the fold, transform and add
-                    new_dots.add(Dot(dot.x, 2*instruction.location - dot.y))
-            return Page(new_dots)
-
-        raise ValueError(f"Can't handle instruction {instruction}")
+        if instruction.axis not in ('x', 'y'):
+            raise ValueError(f"Can't handle instruction {instruction}")
+
+        col = 0 if instruction.axis == 'x' else 1
+        loc = instruction.location
+
+        # dots on the fold are dropped, dots past the fold are reflected back
+        coords = self.coords[self.coords[:, col] != loc]
+        coords[:, col] = np.where(coords[:, col] > loc, 2*loc - coords[:, col], coords[:, col])
+        return Page(coords)
     
 
+@attr.frozen(eq=False)
+class FoldPlan:
+    """A whole sequence of folds, composed into one lookup table per axis
+
+    Each fold only moves coordinates along its own axis, so the final position
+    of a dot is x_map[x], y_map[y], and it survives only if x_kept[x] and y_kept[y].
+    """
+
+    x_map: np.ndarray = attr.ib()
+    y_map: np.ndarray = attr.ib()
+    x_kept: np.ndarray = attr.ib()
+    y_kept: np.ndarray = attr.ib()
+
+    @classmethod
+    def compose(cls, folds: T.Sequence[Fold], size: T.Tuple[int, int]) -> 'FoldPlan':
+        """Compose folds for a page with the given x, y size"""
+        maps = {'x': np.arange(size[0], dtype='int64'), 'y': np.arange(size[1], dtype='int64')}
+        kept = {'x': np.ones(size[0], dtype='bool'), 'y': np.ones(size[1], dtype='bool')}
+
+        for fold in folds:
+            if fold.axis not in maps:
+                raise ValueError(f"Can't handle instruction {fold}")
+            coords = maps[fold.axis]
+            loc = fold.location
+            kept[fold.axis] &= coords != loc
+            maps[fold.axis] = np.where(coords > loc, 2*loc - coords, coords)
+
+        return cls(maps['x'], maps['y'], kept['x'], kept['y'])
+
+    def apply(self, page: Page) -> Page:
+        """Return folded page, transforming all dots in one gather"""
+        x, y = page.coords[:, 0], page.coords[:, 1]
+        keep = self.x_kept[x] & self.y_kept[y]
+        return Page(np.column_stack([self.x_map[x[keep]], self.y_map[y[keep]]]))
+
+
+def fold_all(page: Page, folds: T.Sequence[Fold], num_folds: T.Optional[int] = None) -> Page:
+    """Return page after the first num_folds folds (default all) in a single pass"""
+    return FoldPlan.compose(folds[:num_folds], page.size).apply(page)
+
+
 def parse_input(filename: str) -> T.Tuple[Page, T.Tuple[Fold]]:
     
     with open(filename, 'r') as fp:
@@ -91,11 +205,9 @@ def parse_input(filename: str) -> T.Tuple[Page, T.Tuple[Fold]]:
         pt1, pt2 = fp.read().split('\n\n')
 
 
-    dots = []
-    for line in pt1.strip().split('\n'):
-        dots.append(
-            Dot(*map(int, line.strip().split(',')))
-        )
+    dots = np.array(
+        [line.strip().split(',') for line in pt1.strip().split('\n')], dtype='int64'
+    )
 
     folds = []
     for line in pt2.strip().split('\n'):
@@ -115,12 +227,11 @@ if __name__ == '__main__':
 
     print('puzzle 1 ----------')
     page, folds = parse_input(input_file)
-    for fold in folds:
-        page = page.fold_me(fold)
-        print(f'{fold}: num_dots = {page.num_dots}')
+    print(f'{folds[0]}: num_dots = {fold_all(page, folds, 1).num_dots}')
     print()
     
     print('puzzle 2 ----------')
+    page = fold_all(page, folds)
     page.display()
+    print(f'The code is: {page.read_code()}')
     print()
-    
@@ -0,0 +1,41 @@
+import time
+import typing as T
+
+from polymerize import CompiledRules, VectorPolymer, read_file
+
+
+def timed(func: T.Callable[[], int]) -> T.Tuple[float, int]:
+    """Return runtime in seconds and result of calling func"""
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main(input_file: str, step_counts: T.Sequence[int]):
+
+    template, rules = read_file(input_file)
+
+    print(f'{"steps":>6} {"stepping":>10} {"squaring":>10} {"cached":>10}')
+
+    for num_steps in step_counts:
+        # fresh rules for each row, so no powers are cached yet
+        polymer = VectorPolymer.from_template(template, CompiledRules.from_rules(rules))
+
+        stepping, expected = timed(lambda: polymer.advance(num_steps).score())
+
+        def square():
+            polymer.rules.precompute_powers(num_steps)
+            return polymer.advance(num_steps).score()
+
+        squaring, squared = timed(square)
+        cached, cached_score = timed(lambda: polymer.advance(num_steps).score())
+
+        if not expected == squared == cached_score:
+            raise ValueError(f'Engines disagree after {num_steps} steps')
+
+        print(f'{num_steps:>6} {stepping:10.4f} {squaring:10.4f} {cached:10.4f}')
+
+
+if __name__ == '__main__':
+
+    main('input.txt', [16, 64, 256, 1024, 4096])
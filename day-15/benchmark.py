@@ -0,0 +1,68 @@
+import numpy as np
+import time
+import typing as T
+
+from thread_the_needle import ROUTERS, heap_search, total_cost
+
+
+# the scan router is O(V^2), so only run it on small grids
+MAX_SCAN_SIZE = 100*100
+
+
+def random_costs(size: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.integers(1, 10, (size, size), dtype='uint8')
+
+
+def time_router(name: str, costs: np.ndarray) -> T.Tuple[float, int]:
+    """Return runtime in seconds and total cost of the route"""
+    start = time.perf_counter()
+    route = ROUTERS[name](costs)
+    elapsed = time.perf_counter() - start
+    return elapsed, int(total_cost(costs, route))
+
+
+def main(sizes: T.Sequence[int]):
+
+    print(f'{"size":>6} ' + ' '.join(f'{name:>10}' for name in ROUTERS))
+
+    for size in sizes:
+        costs = random_costs(size)
+        runtimes = []
+        route_costs = set()
+
+        for name in ROUTERS:
+            if name == 'scan' and costs.size > MAX_SCAN_SIZE:
+                runtimes.append(f'{"-":>10}')
+                continue
+            elapsed, route_cost = time_router(name, costs)
+            runtimes.append(f'{elapsed:10.4f}')
+            route_costs.add(route_cost)
+
+        if len(route_costs) != 1:
+            raise ValueError(f'Routers disagree on size {size}: {route_costs}')
+
+        print(f'{size:>6} ' + ' '.join(runtimes))
+
+
+def compare_expanded(sizes: T.Sequence[int], min_cost: int = 1):
+    """Print runtime and nodes expanded for Dijkstra and A* on random grids"""
+
+    print(f'{"size":>6} {"dijkstra":>10} {"expanded":>10} {"astar":>10} {"expanded":>10}')
+
+    for size in sizes:
+        rng = np.random.default_rng(0)
+        costs = rng.integers(min_cost, 10, (size, size), dtype='uint8')
+        columns = []
+        for use_heuristic in (False, True):
+            start = time.perf_counter()
+            _, num_expanded = heap_search(costs, use_heuristic)
+            columns.append(f'{time.perf_counter() - start:10.4f} {num_expanded:>10}')
+        print(f'{size:>6} ' + ' '.join(columns))
+
+
+if __name__ == '__main__':
+
+    main([10, 50, 100, 500, 1000, 2000])
+    print()
+    compare_expanded([100, 500, 1000], min_cost=5)
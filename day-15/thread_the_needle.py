@@ -1,5 +1,7 @@
 import numpy as np
 import typing as T
+from array import array
+from heapq import heappop, heappush
 
 
 def parse_input(filename: str) -> np.ndarray:
@@ -11,6 +13,75 @@ def parse_input(filename: str) -> np.ndarray:
     return np.array(data, dtype='uint8')
 
 
+class TiledGrid:
+    """Read-only view of a cost grid tiled num_tiles times along each axis
+
+    Each tile to the right or down adds 1 to the costs, wrapping 9 back around
+    to 1. Values are computed when accessed, so the tiled grid is never stored.
+    """
+
+    def __init__(self, base: np.ndarray, num_tiles: int = 5):
+        self.base = base
+        self.num_tiles = num_tiles
+        self._base_rows = base.tolist()
+
+    @property
+    def shape(self) -> T.Tuple[int, int]:
+        return self.base.shape[0]*self.num_tiles, self.base.shape[1]*self.num_tiles
+
+    @property
+    def size(self) -> int:
+        return self.shape[0]*self.shape[1]
+
+    def max(self) -> int:
+        # every tile offset from 0 to 2*(num_tiles-1) occurs, so check each base value with each offset
+        values = np.unique(self.base).astype('int64')[:, np.newaxis] + np.arange(2*self.num_tiles - 1)
+        return int(((values - 1) % 9 + 1).max())
+
+    def min(self) -> int:
+        values = np.unique(self.base).astype('int64')[:, np.newaxis] + np.arange(2*self.num_tiles - 1)
+        return int(((values - 1) % 9 + 1).min())
+
+    def __getitem__(self, key) -> T.Union[int, np.ndarray]:
+        """Index by flat index, by (row, col), or by a boolean mask with the full shape"""
+        nr, nc = self.base.shape
+
+        if isinstance(key, (int, np.integer)):
+            row, col = divmod(int(key), self.shape[1])
+            return (self._base_rows[row % nr][col % nc] + row//nr + col//nc - 1) % 9 + 1
+
+        if isinstance(key, np.ndarray) and key.dtype == np.bool_:
+            key = np.nonzero(key)
+
+        rows, cols = (np.asarray(x) for x in key)
+        values = self.base[rows % nr, cols % nc].astype('int64') + rows//nr + cols//nc
+        return (values - 1) % 9 + 1
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        rows, cols = np.indices(self.shape, sparse=True)
+        return self[rows, cols].astype(dtype or self.base.dtype)
+
+
+def flat_costs(node_cost: T.Union[np.ndarray, TiledGrid]) -> T.Sequence[int]:
+    """Return costs indexable by flat index, without materializing a tiled grid"""
+    if isinstance(node_cost, TiledGrid):
+        return node_cost
+    return node_cost.reshape(-1).tolist()
+
+
+def compact_arrays(node_cost: T.Union[np.ndarray, TiledGrid]) -> T.Tuple[array, array]:
+    """Return flat path cost (filled with -1) and upstream arrays, with the smallest safe typecodes
+
+    Any node can be reached along a monotone path, so no path cost exceeds the
+    max node cost times the number of rows plus columns.
+    """
+    nr, nc = node_cost.shape
+    max_path_cost = int(node_cost.max())*(nr + nc)
+    cost_code = 'i' if max_path_cost < 2**31 else 'q'
+    index_code = 'i' if nr*nc < 2**31 else 'q'
+    return array(cost_code, [-1])*(nr*nc), array(index_code, [0])*(nr*nc)
+
+
 def least_cost_route(node_cost: np.ndarray) -> np.ndarray:
     
     # init
@@ -21,8 +92,7 @@ def least_cost_route(node_cost: np.ndarray) -> np.ndarray:
     nbr_offsets = np.array([[-1, 0], [0, 1], [1, 0], [0, -1]], dtype=np.int8)
 
     path_cost = np.full(shape, np.inf, dtype=np.single)
-    upstream_row = np.full(shape, 0, dtype=np.short)
-    upstream_col = np.full(shape, 0, dtype=np.short)
+    upstream = np.zeros(size, dtype=np.int32 if size < 2**31 else np.int64)
     linear_idx = np.reshape(np.arange(size), shape)
     unvisited = np.full(shape, True, dtype=np.bool_)
 
@@ -61,8 +131,7 @@ def least_cost_route(node_cost: np.ndarray) -> np.ndarray:
                 
                 if candidate_cost < path_cost[nbr_idx]:
                     path_cost[nbr_idx] = candidate_cost
-                    upstream_row[nbr_idx] = idx[0]
-                    upstream_col[nbr_idx] = idx[1]
+                    upstream[linear_idx[nbr_idx]] = linear_idx[idx]
 
         # select the next node
         idx = next_idx()
@@ -72,51 +141,177 @@ def least_cost_route(node_cost: np.ndarray) -> np.ndarray:
             break
 
     # walk back the path from end to start
-    path = np.zeros(shape, dtype=np.bool_)
-    idx = end_idx
+    return trace_path(upstream, shape)
+
 
-    while idx != start_idx:
+def trace_path(upstream: T.Sequence[int], shape: T.Tuple[int, int]) -> np.ndarray:
+    """Return boolean path mask by walking back from the end to the start (excluded)
+
+    upstream holds the flat index of the previous node on the path for each node
+    """
+    path = np.zeros(shape[0]*shape[1], dtype=np.bool_)
+    idx = path.size - 1
+
+    while idx != 0:
         path[idx] = True
-        idx = (upstream_row[idx], upstream_col[idx])
+        idx = upstream[idx]
 
-    return path
+    return path.reshape(shape)
 
 
-def total_cost(node_cost: np.ndarray, path: np.ndarray) -> int:
-    return np.sum(node_cost[path])
-    
+def heap_search(node_cost: T.Union[np.ndarray, TiledGrid], use_heuristic: bool = False) -> T.Tuple[array, int]:
+    """Run Dijkstra (or A*) from start to end, return flat upstream array and number of nodes expanded
 
-def tile(template: np.ndarray) -> np.ndarray:
+    The A* heuristic is the Manhattan distance to the end times the smallest node
+    cost, which never overestimates, and is consistent, so each node is expanded once.
+    """
+    nr, nc = node_cost.shape
+    size = nr*nc
+    end = size - 1
+    cost = flat_costs(node_cost)
+    min_cost = int(node_cost.min()) if use_heuristic else 0
 
-    def _increment(x: np.ndarray):
-        return np.maximum(1, (1 + x) % 10)
+    def heuristic(idx: int) -> int:
+        row, col = divmod(idx, nc)
+        return min_cost*((nr - 1 - row) + (nc - 1 - col))
+
+    path_cost, upstream = compact_arrays(node_cost)  # path cost of -1 means not reached yet
+    visited = bytearray(size)
+    num_expanded = 0
+
+    path_cost[0] = cost[0]
+    queue = [(cost[0] + heuristic(0), 0)]
+
+    while queue:
+        _, idx = heappop(queue)
+        if visited[idx]:
+            continue
+        visited[idx] = 1
+        num_expanded += 1
+
+        if idx == end:
+            break
 
-    tiles = [template]
-    for _ in range(1, 5):
-        tiles.append(_increment(tiles[-1]))
+        this_cost = path_cost[idx]
+        col = idx % nc
+        for nbr, valid in (
+            (idx - nc, idx >= nc),
+            (idx + 1, col < nc - 1),
+            (idx + nc, idx < size - nc),
+            (idx - 1, col > 0),
+        ):
+            if valid and not visited[nbr]:
+                candidate_cost = this_cost + cost[nbr]
+                if path_cost[nbr] < 0 or candidate_cost < path_cost[nbr]:
+                    path_cost[nbr] = candidate_cost
+                    upstream[nbr] = idx
+                    heappush(queue, (candidate_cost + heuristic(nbr) if min_cost else candidate_cost, nbr))
+
+    return upstream, num_expanded
+
+
+def heap_route(node_cost: T.Union[np.ndarray, TiledGrid]) -> np.ndarray:
+    """Same as least_cost_route, but selects the next node from a priority queue
+
+    Works on flat indices, and stops as soon as the end node is reached.
+    """
+    upstream, _ = heap_search(node_cost)
+    return trace_path(upstream, node_cost.shape)
+
+
+def astar_route(node_cost: T.Union[np.ndarray, TiledGrid]) -> np.ndarray:
+    """Same as heap_route, but guided toward the end by an admissible heuristic"""
+    upstream, _ = heap_search(node_cost, use_heuristic=True)
+    return trace_path(upstream, node_cost.shape)
+
+
+def bucket_route(node_cost: T.Union[np.ndarray, TiledGrid]) -> np.ndarray:
+    """Same as heap_route, but with a circular bucket queue (Dial's algorithm)
+
+    Node costs are small non-negative integers, so every queued path cost is
+    within max cost of the current one, and a ring of max cost + 1 buckets
+    makes each push and pop O(1).
+    """
+    nr, nc = node_cost.shape
+    size = nr*nc
+    end = size - 1
+    cost = flat_costs(node_cost)
+    num_buckets = int(node_cost.max()) + 1
+
+    path_cost, upstream = compact_arrays(node_cost)  # path cost of -1 means not reached yet
+    visited = bytearray(size)
+
+    buckets: T.List[T.List[int]] = [[] for _ in range(num_buckets)]
+    current = cost[0]
+    path_cost[0] = current
+    buckets[current % num_buckets].append(0)
+    num_queued = 1
+
+    while num_queued:
+        bucket = buckets[current % num_buckets]
+        if not bucket:
+            current += 1
+            continue
+
+        idx = bucket.pop()
+        num_queued -= 1
+        if visited[idx] or path_cost[idx] != current:
+            # stale entry, this node was already reached more cheaply
+            continue
+        visited[idx] = 1
+
+        if idx == end:
+            break
+
+        col = idx % nc
+        for nbr, valid in (
+            (idx - nc, idx >= nc),
+            (idx + 1, col < nc - 1),
+            (idx + nc, idx < size - nc),
+            (idx - 1, col > 0),
+        ):
+            if valid and not visited[nbr]:
+                candidate_cost = current + cost[nbr]
+                if path_cost[nbr] < 0 or candidate_cost < path_cost[nbr]:
+                    path_cost[nbr] = candidate_cost
+                    upstream[nbr] = idx
+                    buckets[candidate_cost % num_buckets].append(nbr)
+                    num_queued += 1
+
+    return trace_path(upstream, (nr, nc))
+
+
+ROUTERS = {
+    'scan': least_cost_route,
+    'heap': heap_route,
+    'bucket': bucket_route,
+    'astar': astar_route,
+}
+
+
+def total_cost(node_cost: np.ndarray, path: np.ndarray) -> int:
+    return np.sum(node_cost[path])
     
-    template = np.concatenate(tiles, axis=1)
 
-    tiles = [template]
-    for _ in range(1, 5):
-        tiles.append(_increment(tiles[-1]))
+def tile(template: np.ndarray, num_tiles: int = 5) -> np.ndarray:
+    return np.asarray(TiledGrid(template, num_tiles))
 
-    return np.concatenate(tiles, axis=0)
 
 
+def main(input_file: str, router: str = 'heap'):
 
-def main(input_file: str):
+    least_cost = ROUTERS[router]
 
     print('puzzle 1 ----------')
     costs = parse_input(input_file)
-    route = least_cost_route(costs)
+    route = least_cost(costs)
     route_cost = total_cost(costs, route)
     print(f'Shortest path risk is: {route_cost}')
     print()
 
     print('puzzle 2 ----------')
-    tiled_costs = tile(costs)
-    tiled_route = least_cost_route(tiled_costs)
+    tiled_costs = TiledGrid(costs) if router != 'scan' else tile(costs)
+    tiled_route = least_cost(tiled_costs)
     tiled_route_cost = total_cost(tiled_costs, tiled_route)
     print(f'Shortest tiled path risk is: {tiled_route_cost}')
     print()
@@ -125,8 +320,8 @@ def main(input_file: str):
 if __name__ == '__main__':
 
     
-    input_file = 'test_input.txt'
-    # input_file = 'input.txt'
+    # input_file = 'test_input.txt'
+    input_file = 'input.txt'
 
     main(input_file)
 
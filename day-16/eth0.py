@@ -1,15 +1,13 @@
-from bitarray import frozenbitarray, bitarray
-from bitarray.util import hex2ba, ba2int
 import dataclasses as dc 
+import operator
+from functools import cached_property
 import enum
+import numpy as np
 import typing as T
 from pdb import set_trace
 from math import prod
 
 
-ENDIAN = 'big'
-
-
 class PacketType(enum.Enum):
     SUM = 0
     PRODUCT = 1
@@ -21,6 +19,41 @@ class PacketType(enum.Enum):
     EQUAL_TO = 7
 
 
+class BitWords:
+    """Read-only bit string stored as 64-bit words, read as integer fields at any bit index
+
+    Fields are read with shifts and masks on (at most) two neighboring words,
+    so there is no slicing or copying of the bits.
+    """
+
+    __slots__ = ('words', 'num_bits')
+
+    def __init__(self, words: T.List[int], num_bits: int):
+        self.words = words
+        self.num_bits = num_bits
+
+    @classmethod
+    def from_hex(cls, data_hex: str) -> 'BitWords':
+        data_hex = data_hex.strip()
+        num_bits = 4*len(data_hex)
+
+        # pad to whole words, plus one spare word so a field can always span two
+        data = bytes.fromhex(data_hex + '0'*(len(data_hex) % 2))
+        data += bytes(-len(data) % 8 + 8)
+        return cls(np.frombuffer(data, dtype='>u8').tolist(), num_bits)
+
+    def __len__(self) -> int:
+        return self.num_bits
+
+    def read(self, idx: int, width: int) -> int:
+        """Return the unsigned integer in bits [idx, idx + width), for width up to 64"""
+        if idx + width > self.num_bits:
+            raise IndexError(f'Cannot read {width} bits at index {idx} of {self.num_bits}')
+        word, offset = idx >> 6, idx & 63
+        pair = (self.words[word] << 64) | self.words[word + 1]
+        return (pair >> (128 - offset - width)) & ((1 << width) - 1)
+
+
 @dc.dataclass(frozen=True)
 class Header:
 
@@ -28,12 +61,12 @@ class Header:
     type: PacketType
 
     @classmethod
-    def from_bits(cls, bits: bitarray, idx: int) -> T.Tuple['Header', int]:
+    def from_bits(cls, bits: BitWords, idx: int) -> T.Tuple['Header', int]:
         """Parse packet header from bits starting at index 'idx'
         Return the header and the index just after the end of the parsed header
         """
-        version = ba2int(bits[idx:idx+3])
-        type_ = PacketType(ba2int(bits[idx+3:idx+6]))
+        version = bits.read(idx, 3)
+        type_ = PacketType(bits.read(idx+3, 3))
         return cls(version, type_), idx + 6
 
 
@@ -53,19 +86,19 @@ class LiteralPacket(Packet):
     value: int
     
     @classmethod
-    def from_bits(cls, header: Header, bits: bitarray, idx: int, parent: T.Optional[Packet]) -> T.Tuple['LiteralPacket', T.Optional[int]]:
+    def from_bits(cls, header: Header, bits: BitWords, idx: int, parent: T.Optional[Packet]) -> T.Tuple['LiteralPacket', T.Optional[int]]:
         """Parse literal packet with header 'header' and parent 'parent' starting at index 'idx'
         Return the packet and the index just after the end of the parsed packet (or None if this is the last packet)
         """
-        value_bits = bitarray(endian=ENDIAN)
+        value = 0
         while True:
-            flag_bit = bits[idx] 
-            value_bits.extend(bits[idx+1:idx+5])
+            group = bits.read(idx, 5)
+            value = (value << 4) | (group & 0b1111)
             idx += 5
-            if flag_bit == 0:
+            if not group & 0b10000:
                 break  # we just parsed the last digit
 
-        return cls(header, parent, ba2int(value_bits)), idx 
+        return cls(header, parent, value), idx 
 
 
 @dc.dataclass
@@ -73,7 +106,7 @@ class OperatorPacket(Packet):
 
     children: T.List[Packet] = dc.field(repr=False)
 
-    @property
+    @cached_property
     def value(self) -> int:
 
         if self.header.type == PacketType.SUM:
@@ -100,13 +133,13 @@ class OperatorPacket(Packet):
         raise ValueError(f'No operation defined for type: {self.header.type}')
     
     @classmethod
-    def from_bits(cls, header: Header, bits: bitarray, idx: int, parent: T.Optional[Packet]) -> T.Tuple['OperatorPacket', T.Optional[int]]:
+    def from_bits(cls, header: Header, bits: BitWords, idx: int, parent: T.Optional[Packet]) -> T.Tuple['OperatorPacket', T.Optional[int]]:
         """Parse operator packet with header 'header' and parent 'parent' starting at index 'idx'
         Return the packet and the index just after the end of the parsed packet (or None if this is the last packet)
         """
         self = cls(header, parent, children=[])
 
-        length_type_id = bits[idx]
+        length_type_id = bits.read(idx, 1)
         idx += 1
 
         children = []
@@ -114,7 +147,7 @@ class OperatorPacket(Packet):
         if length_type_id == 0:
             # the next 15 bits are a number that represents the total length
             #   in bits of the sub-packets contained by this packet
-            children_num_bits = ba2int(bits[idx:idx+15])
+            children_num_bits = bits.read(idx, 15)
             idx += 15
             last_child_idx = idx + children_num_bits
             
@@ -125,7 +158,7 @@ class OperatorPacket(Packet):
         else: 
             # the next 11 bits are a number that represents the number of
             #   sub-packets immediately contained by this packet
-            num_child_packets = ba2int(bits[idx:idx+11])
+            num_child_packets = bits.read(idx, 11)
             idx += 11
 
             for _ in range(num_child_packets):
@@ -135,7 +168,7 @@ class OperatorPacket(Packet):
         return self, idx
 
 
-def next_packet(bits: bitarray, idx: int, parent: T.Optional[Packet]) -> T.Tuple[Packet, T.Optional[int]]:
+def next_packet(bits: BitWords, idx: int, parent: T.Optional[Packet]) -> T.Tuple[Packet, T.Optional[int]]:
     """Parse the next packet beginning at index 'idx' with optional parent packet 'parent'
     Return the packet and the index just after the end of the parsed packet, or None if that was the last packet
     """
@@ -150,21 +183,19 @@ def next_packet(bits: bitarray, idx: int, parent: T.Optional[Packet]) -> T.Tuple
     
 
 
-def hex_to_bits(data_hex: str) -> frozenbitarray:
-    return frozenbitarray(hex2ba(data_hex, endian=ENDIAN))
-
-
 def hex_to_packet(data_hex: str) -> Packet:
-    data_bits = hex_to_bits(data_hex)
+    data_bits = BitWords.from_hex(data_hex)
     data_packet, _ = next_packet(data_bits, 0, None)
     return data_packet
 
 
 def unpack_children(packet: Packet) -> T.List[Packet]:
-    objs = [packet]
-    if hasattr(packet, 'children'):
-        for child in packet.children:
-            objs.extend(unpack_children(child))
+    objs = []
+    stack = [packet]
+    while stack:
+        obj = stack.pop()
+        objs.append(obj)
+        stack.extend(reversed(getattr(obj, 'children', ())))
     return objs
 
 
@@ -172,6 +203,271 @@ def sum_versions(packet: Packet) -> int:
     return sum(p.header.version for p in unpack_children(packet))
         
 
+# operations on the values of the children, by packet type
+OPERATIONS: T.Dict[int, T.Callable[[T.List[int]], int]] = {
+    PacketType.SUM.value: sum,
+    PacketType.PRODUCT.value: prod,
+    PacketType.MINIMUM.value: min,
+    PacketType.MAXIMUM.value: max,
+    PacketType.GREATER_THAN.value: lambda x: int(x[0] > x[1]),
+    PacketType.LESS_THAN.value: lambda x: int(x[0] < x[1]),
+    PacketType.EQUAL_TO.value: lambda x: int(x[0] == x[1]),
+}
+
+
+class FlatPackets:
+    """All packets in a transmission as flat lists in post-order (children before parents)
+
+    The root packet is last. Literal is 0 for operator packets, and child count
+    is 0 for literal packets.
+    """
+
+    __slots__ = ('types', 'versions', 'literals', 'num_children', '_values')
+
+    def __init__(self):
+        self.types: T.List[int] = []
+        self.versions: T.List[int] = []
+        self.literals: T.List[int] = []
+        self.num_children: T.List[int] = []
+        self._values: T.Optional[T.List[int]] = None
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def append(self, type_: int, version: int, literal: int, num_children: int):
+        self.types.append(type_)
+        self.versions.append(version)
+        self.literals.append(literal)
+        self.num_children.append(num_children)
+
+    def sum_versions(self) -> int:
+        return sum(self.versions)
+
+    @property
+    def values(self) -> T.List[int]:
+        """Value of every packet, computed once in a single pass with a stack of child values"""
+        if self._values is None:
+            values = []
+            stack = []
+            literal_type = PacketType.LITERAL.value
+            for type_, literal, num_children in zip(self.types, self.literals, self.num_children):
+                if type_ == literal_type:
+                    value = literal
+                else:
+                    if type_ not in OPERATIONS:
+                        raise ValueError(f'No operation defined for type: {type_}')
+                    args = stack[len(stack) - num_children:]
+                    del stack[len(stack) - num_children:]
+                    value = OPERATIONS[type_](args)
+                stack.append(value)
+                values.append(value)
+            self._values = values
+        return self._values
+
+    @property
+    def value(self) -> int:
+        return self.values[-1]
+
+
+def parse_flat(bits: BitWords, idx: int = 0) -> FlatPackets:
+    """Parse one (outermost) packet without recursion, return all packets in post-order
+
+    Open operator packets are kept on an explicit stack of frames holding
+    [type, version, is_length_in_bits, end index or child count, children so far].
+    """
+    packets = FlatPackets()
+    literal_type = PacketType.LITERAL.value
+    stack: T.List[T.List[int]] = []
+
+    while True:
+        version = bits.read(idx, 3)
+        type_ = bits.read(idx + 3, 3)
+        idx += 6
+
+        if type_ == literal_type:
+            value = 0
+            while True:
+                group = bits.read(idx, 5)
+                value = (value << 4) | (group & 0b1111)
+                idx += 5
+                if not group & 0b10000:
+                    break
+            packets.append(type_, version, value, 0)
+            if stack:
+                stack[-1][4] += 1
+
+        elif bits.read(idx, 1) == 0:
+            stack.append([type_, version, 1, idx + 16 + bits.read(idx + 1, 15), 0])
+            idx += 16
+
+        else:
+            stack.append([type_, version, 0, bits.read(idx + 1, 11), 0])
+            idx += 12
+
+        # close every operator packet that is now complete
+        while stack:
+            type_, version, in_bits, limit, num_children = stack[-1]
+            if (idx < limit) if in_bits else (num_children < limit):
+                break
+            stack.pop()
+            packets.append(type_, version, 0, num_children)
+            if stack:
+                stack[-1][4] += 1
+
+        if not stack:
+            return packets
+
+
+def hex_to_flat(data_hex: str) -> FlatPackets:
+    return parse_flat(BitWords.from_hex(data_hex))
+
+
+class HexBitStream:
+    """Bits read on demand from a file object holding hex characters
+
+    Hex text is read in chunks of chunk_size characters, and a small integer
+    bit buffer is refilled from it as needed, so memory does not depend on the
+    length of the input. Whitespace in the input is ignored.
+    """
+
+    __slots__ = ('fp', 'chunk_size', 'text', 'text_idx', 'buffer', 'num_buffered', 'position')
+
+    def __init__(self, fp: T.TextIO, chunk_size: int = 1 << 16):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.text = ''
+        self.text_idx = 0
+        self.buffer = 0
+        self.num_buffered = 0
+        self.position = 0  # number of bits read so far
+
+    def _refill(self):
+        if self.text_idx == len(self.text):
+            chunk = self.fp.read(self.chunk_size)
+            if not chunk:
+                raise EOFError(f'Transmission ended after {self.position} bits')
+            self.text = ''.join(chunk.split())
+            self.text_idx = 0
+
+        # take at most 16 hex digits at a time, so the buffer stays small
+        digits = self.text[self.text_idx:self.text_idx + 16]
+        self.text_idx += len(digits)
+        if digits:
+            self.buffer = (self.buffer << 4*len(digits)) | int(digits, 16)
+            self.num_buffered += 4*len(digits)
+
+    def read(self, width: int) -> int:
+        """Return the unsigned integer in the next width bits"""
+        while self.num_buffered < width:
+            self._refill()
+        self.num_buffered -= width
+        self.position += width
+        value = self.buffer >> self.num_buffered
+        self.buffer &= (1 << self.num_buffered) - 1
+        return value
+
+
+class PacketEvent(T.NamedTuple):
+    """One step in a streamed parse"""
+    kind: str  # one of 'literal', 'start', 'end'
+    version: int
+    type: int
+    value: int  # literal value, 0 for operator start and end
+
+
+def iter_events(stream: HexBitStream) -> T.Iterator[PacketEvent]:
+    """Yield packet events for one (outermost) packet, in the order they appear
+
+    Only the open operator packets are held in memory, as frames of
+    [type, version, is_length_in_bits, end position or child count, children so far].
+    """
+    literal_type = PacketType.LITERAL.value
+    stack: T.List[T.List[int]] = []
+
+    while True:
+        version = stream.read(3)
+        type_ = stream.read(3)
+
+        if type_ == literal_type:
+            value = 0
+            while True:
+                group = stream.read(5)
+                value = (value << 4) | (group & 0b1111)
+                if not group & 0b10000:
+                    break
+            yield PacketEvent('literal', version, type_, value)
+            if stack:
+                stack[-1][4] += 1
+
+        elif stream.read(1) == 0:
+            num_bits = stream.read(15)
+            stack.append([type_, version, 1, stream.position + num_bits, 0])
+            yield PacketEvent('start', version, type_, 0)
+
+        else:
+            stack.append([type_, version, 0, stream.read(11), 0])
+            yield PacketEvent('start', version, type_, 0)
+
+        # close every operator packet that is now complete
+        while stack:
+            type_, version, in_bits, limit, num_children = stack[-1]
+            if (stream.position < limit) if in_bits else (num_children < limit):
+                break
+            stack.pop()
+            yield PacketEvent('end', version, type_, 0)
+            if stack:
+                stack[-1][4] += 1
+
+        if not stack:
+            return
+
+
+# combine an operator's value so far with its next child value, by packet type
+COMBINE: T.Dict[int, T.Callable[[int, int], int]] = {
+    PacketType.SUM.value: operator.add,
+    PacketType.PRODUCT.value: operator.mul,
+    PacketType.MINIMUM.value: min,
+    PacketType.MAXIMUM.value: max,
+    PacketType.GREATER_THAN.value: lambda a, b: int(a > b),
+    PacketType.LESS_THAN.value: lambda a, b: int(a < b),
+    PacketType.EQUAL_TO.value: lambda a, b: int(a == b),
+}
+
+
+def evaluate_events(events: T.Iterable[PacketEvent]) -> T.Tuple[int, int]:
+    """Return sum of version numbers and value of the outermost packet, folding values as they arrive"""
+    version_sum = 0
+    result = None
+    stack: T.List[T.List[T.Optional[int]]] = []  # [type, value so far] for each open operator
+
+    for event in events:
+        if event.kind != 'end':
+            version_sum += event.version
+
+        if event.kind == 'start':
+            if event.type not in COMBINE:
+                raise ValueError(f'No operation defined for type: {event.type}')
+            stack.append([event.type, None])
+            continue
+
+        value = event.value if event.kind == 'literal' else stack.pop()[1]
+
+        if not stack:
+            result = value
+        elif stack[-1][1] is None:
+            stack[-1][1] = value
+        else:
+            stack[-1][1] = COMBINE[stack[-1][0]](stack[-1][1], value)
+
+    return version_sum, result
+
+
+def evaluate_file(filename: str, chunk_size: int = 1 << 16) -> T.Tuple[int, int]:
+    """Return sum of version numbers and value of the transmission in a hex file, streamed"""
+    with open(filename, 'r') as fp:
+        return evaluate_events(iter_events(HexBitStream(fp, chunk_size)))
+
+
 if __name__ == '__main__':
     
     # test case 1: literal packet with known value
@@ -221,3 +517,15 @@ if __name__ == '__main__':
     print(f'Value of input packet is: {input_packet.value}')
     print()
     
+
+    print('flat ----------')
+    input_flat = hex_to_flat(input_hex)
+    print(f'Sum of version numbers: {input_flat.sum_versions()}')
+    print(f'Value of input packet is: {input_flat.value}')
+    print()
+
+    print('streamed ----------')
+    version_sum, value = evaluate_file('input.txt')
+    print(f'Sum of version numbers: {version_sum}')
+    print(f'Value of input packet is: {value}')
+    print()